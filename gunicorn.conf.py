@@ -0,0 +1,22 @@
+# -*- coding: utf-8 -*-
+
+# ------------------------------------------------------------
+# Konfiguracja gunicorn (wczytywana automatycznie):
+#   gunicorn mamyzabawki_api:app
+# ------------------------------------------------------------
+import os
+
+bind = f"0.0.0.0:{os.getenv('PORT', '5000')}"
+
+# Zapytania do OpenAI to głównie czekanie na sieć, więc zamiast wielu
+# procesów używamy wątków: jeden worker obsługuje wiele /get_response naraz.
+# Domyślnie jeden proces: bez REDIS_URL postęp zadań jest w pamięci procesu.
+# Z REDIS_URL można podnieść WEB_CONCURRENCY (katalog static/ musi być wspólny).
+worker_class = "gthread"
+workers = int(os.getenv("WEB_CONCURRENCY", "1"))
+threads = int(os.getenv("GUNICORN_THREADS", "64"))
+
+# Bez ustawienia `timeout`: przy gthread to tylko kontrola heartbeatu workera,
+# nie limit czasu zapytania. Czas /get_response ograniczają timeouty i retry
+# wywołań OpenAI (call_openai) – w najgorszym razie kilka minut.
+keepalive = 5
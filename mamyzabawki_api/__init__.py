@@ -0,0 +1,127 @@
+# -*- coding: utf-8 -*-
+
+import os
+import uuid
+from threading import Thread
+from flask import Flask, request, jsonify, render_template
+from flask_limiter import Limiter
+from flask_limiter.util import get_remote_address
+
+from mamyzabawki_api.core import (
+    BASE_DIR,
+    REDIS_URL,
+    STATIC_DIR,
+    build_prompt,
+    call_openai,
+    clean_description,
+    compact_html,
+    estimate_max_tokens,
+    norm,
+    process_task,
+    tasks,
+)
+
+# ------------------------------------------------------------
+# Konfiguracja
+# ------------------------------------------------------------
+app = Flask(
+    __name__,
+    template_folder=os.path.join(BASE_DIR, "templates"),
+    static_folder=STATIC_DIR,
+)
+
+# Limity zapytań na adres IP (składnia flask-limiter, np. "30/minute")
+RATE_LIMIT_GET_RESPONSE = os.getenv("RATE_LIMIT_GET_RESPONSE", "30/minute")
+RATE_LIMIT_RUN_ASYNC = os.getenv("RATE_LIMIT_RUN_ASYNC", "5/hour")
+
+
+# ------------------------------------------------------------
+# Limity zapytań (chronią limit RPM/TPM konta OpenAI)
+# ------------------------------------------------------------
+limiter = Limiter(
+    get_remote_address,
+    app=app,
+    storage_uri=REDIS_URL or "memory://",
+    headers_enabled=True,
+)
+
+
+@app.errorhandler(429)
+def rate_limited(e):
+    """Odpowiedź JSON po przekroczeniu limitu (nagłówek Retry-After dodaje limiter)"""
+    print(f"⛔ Limit zapytań przekroczony: {get_remote_address()} {request.path} ({e.description})")
+    return jsonify({"error": f"Za dużo zapytań, limit: {e.description}"}), 429
+
+
+# ------------------------------------------------------------
+# Endpoint API – pojedynczy opis
+# ------------------------------------------------------------
+@app.route("/get_response", methods=["POST"])
+@limiter.limit(RATE_LIMIT_GET_RESPONSE)
+def get_response():
+    """Generuje pojedynczy opis produktu"""
+    try:
+        data = request.get_json(force=True)
+        name = norm(data.get("name"))
+        description = clean_description(name, norm(data.get("description")))
+        attributes = data.get("attributes", [])
+        producer_name = norm(data.get("producer_name"))
+        image_url = norm(data.get("image_url"))
+
+        prompt = build_prompt(name, description, attributes, producer_name, image_url)
+        html_result = call_openai(prompt, estimate_max_tokens(description, attributes))
+        html_result = compact_html(html_result)
+
+
+        if request.args.get("format") == "html":
+            return html_result, 200, {"Content-Type": "text/html; charset=utf-8"}
+        return jsonify({"response": html_result})
+
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+# ------------------------------------------------------------
+# Endpoints asynchroniczne
+# ------------------------------------------------------------
+@app.route("/")
+def home():
+    return render_template("index.html")
+
+
+@app.route("/run_async", methods=["POST"])
+@limiter.limit(RATE_LIMIT_RUN_ASYNC)
+def run_async():
+    """Uruchamia przetwarzanie wsadowe asynchronicznie"""
+    try:
+        shop = request.form["shop"].strip()
+        user = request.form["user"].strip()
+        password = request.form["pass"].strip()
+        model = request.form.get("model", "gpt-4o-mini").strip() or "gpt-4o-mini"
+        file = request.files.get("ids_file")
+
+        if not file:
+            return jsonify({"error": "Brak pliku"}), 400
+
+        # Odczyt ID prosto ze strumienia uploadu, bez pliku tymczasowego
+        product_ids = [
+            line.decode("utf-8-sig").strip() for line in file.stream if line.strip()
+        ]
+
+        task_id = str(uuid.uuid4())
+        thread = Thread(target=process_task, args=(task_id, shop, user, password, model, product_ids))
+        thread.start()
+
+        return jsonify({"task_id": task_id})
+
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+@app.route("/status/<task_id>")
+def status(task_id):
+    """Zwraca status postępu"""
+    task = tasks.get(task_id)
+    if not task:
+        return jsonify({"error": "Nie znaleziono zadania"}), 404
+    return jsonify(task)
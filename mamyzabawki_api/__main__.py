@@ -0,0 +1,11 @@
+# -*- coding: utf-8 -*-
+
+# ------------------------------------------------------------
+# Uruchomienie serwera: python -m mamyzabawki_api
+# ------------------------------------------------------------
+import os
+
+from mamyzabawki_api import app
+
+if __name__ == "__main__":
+    app.run(host="0.0.0.0", port=int(os.getenv("PORT", 5000)))
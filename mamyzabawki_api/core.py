@@ -0,0 +1,978 @@
+# -*- coding: utf-8 -*-
+
+import os
+import json
+import time
+import hashlib
+import itertools
+import html
+import random
+import sqlite3
+import orjson
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+import re
+from collections import OrderedDict, deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from threading import Lock
+from datetime import datetime
+from functools import lru_cache
+
+# ------------------------------------------------------------
+# Wspólny rdzeń: konfiguracja, sesja HTTP, cache, limiter, OpenAI i Shoper.
+# Jedna instancja SESSION / CACHE / BUCKET na proces, wspólna dla wątków.
+# ------------------------------------------------------------
+
+# ------------------------------------------------------------
+# Konfiguracja
+# ------------------------------------------------------------
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+STATIC_DIR = os.path.join(BASE_DIR, "static")
+
+OPENAI_MODEL = os.getenv("OPENAI_MODEL", "gpt-4o-mini")
+OPENAI_API_KEY = os.getenv("OPENAI_API_KEY", "").strip()
+OPENAI_API_URL = "https://api.openai.com/v1"
+OPENAI_AUTH_HEADERS = {
+    "Authorization": f"Bearer {OPENAI_API_KEY}",
+    "Accept-Encoding": "gzip, deflate",
+}
+OPENAI_HEADERS = {**OPENAI_AUTH_HEADERS, "Content-Type": "application/json"}
+SYSTEM_MSG = {
+    "role": "system",
+    "content": (
+        "Jesteś ekspertem od tworzenia profesjonalnych, technicznych opisów produktów. "
+        "Zawsze zwracasz czysty kod HTML zgodny z wymaganym układem, bez znaczników ```."
+    ),
+}
+MAX_RETRIES = 5
+RETRY_MAX_DELAY = 60
+RETRYABLE_STATUS = (429, 500, 502, 503, 504)
+SHOPER_CONCURRENCY = int(os.getenv("SHOPER_CONCURRENCY", "16"))
+SHOPER_TOKEN_TTL = 3300  # gdy Shoper nie poda expires_in
+SHOPER_TOKEN_MARGIN = 300  # odnowienie tokenu z wyprzedzeniem
+
+# Ograniczenie danych wejściowych promptu (mniej tokenów = taniej i szybciej)
+DESCRIPTION_MAX_CHARS = 2000
+ATTRIBUTES_MAX = 20
+ATTRIBUTE_VALUE_MAX_CHARS = 200
+OPENAI_TEMPERATURE = 0.3
+# Górny limit tokenów odpowiedzi na jeden produkt; faktyczny jest szacowany
+OPENAI_MAX_TOKENS = int(os.getenv("OPENAI_MAX_TOKENS", "1500"))
+# Limity czasu w sekundach: połączenie oraz odczyt odpowiedzi o długości
+# OPENAI_MAX_TOKENS (dla dłuższych odpowiedzi odczyt rośnie proporcjonalnie)
+OPENAI_CONNECT_TIMEOUT = 5
+OPENAI_TIMEOUT = int(os.getenv("OPENAI_TIMEOUT", "60"))
+OPENAI_CONCURRENCY = int(os.getenv("OPENAI_CONCURRENCY", "10"))
+# Liczba produktów opisywanych w jednym zapytaniu do OpenAI (1 = osobno)
+OPENAI_PRODUCTS_PER_REQUEST = int(os.getenv("OPENAI_PRODUCTS_PER_REQUEST", "5"))
+# Powyżej tylu produktów zadanie idzie przez OpenAI Batch API (0 = wyłączone)
+OPENAI_BATCH_THRESHOLD = int(os.getenv("OPENAI_BATCH_THRESHOLD", "20"))
+OPENAI_BATCH_POLL_INTERVAL = int(os.getenv("OPENAI_BATCH_POLL_INTERVAL", "30"))
+OPENAI_BATCH_DEADLINE = 25 * 3600  # okno completion_window 24h + 1h marginesu
+OPENAI_RPM = int(os.getenv("OPENAI_RPM", "3500"))
+OPENAI_TPM = int(os.getenv("OPENAI_TPM", "200000"))
+
+# Cache odpowiedzi OpenAI: enabled | replay | write-only | disabled
+OPENAI_CACHE_MODE = os.getenv("OPENAI_CACHE_MODE", "enabled").strip().lower()
+OPENAI_CACHE_PATH = os.getenv("OPENAI_CACHE_PATH", os.path.join(BASE_DIR, ".openai_cache"))
+OPENAI_CACHE_LRU_SIZE = 4096
+
+# Postęp zadań: bez REDIS_URL w pamięci procesu (tylko jeden worker)
+REDIS_URL = os.getenv("REDIS_URL", "").strip()
+TASK_TTL = 86400
+
+# Wspólna sesja HTTP z pulą połączeń keep-alive (OpenAI + Shoper).
+# Shoper: adapter ponawia błędy połączenia (także przy POST logowania)
+# oraz GET-y zakończone 429/5xx.
+# OpenAI: osobny adapter bez żadnych ponowień – retry/backoff robi
+# wyłącznie call_openai, a polling batcha ma własną pętlę.
+SESSION = requests.Session()
+SESSION.mount(
+    "https://",
+    HTTPAdapter(
+        pool_connections=32,
+        pool_maxsize=64,
+        max_retries=Retry(
+            total=3,
+            backoff_factor=0.5,
+            status_forcelist=RETRYABLE_STATUS,
+            allowed_methods=frozenset({"GET"}),
+            raise_on_status=False,
+        ),
+    ),
+)
+SESSION.mount(
+    "https://api.openai.com/",
+    HTTPAdapter(pool_connections=4, pool_maxsize=64, max_retries=Retry(total=0)),
+)
+SESSION.headers["Connection"] = "keep-alive"
+
+
+# ------------------------------------------------------------
+# Cache odpowiedzi OpenAI (LRU w pamięci + SQLite na dysku)
+# ------------------------------------------------------------
+class ResponseCache:
+    """Cache odpowiedzi kluczowany SHA256(prompt || model || temperature || max_tokens)"""
+
+    def __init__(self, path, maxsize=OPENAI_CACHE_LRU_SIZE):
+        self.path = path
+        self.maxsize = maxsize
+        self._lru = OrderedDict()
+        self._lock = Lock()
+        self._db = None
+
+    @staticmethod
+    def key(prompt, model, temperature, max_tokens):
+        raw = f"{prompt}{model}{temperature}{max_tokens}"
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def _conn(self):
+        if self._db is None:
+            os.makedirs(self.path, exist_ok=True)
+            self._db = sqlite3.connect(
+                os.path.join(self.path, "responses.sqlite3"), check_same_thread=False
+            )
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS responses (key TEXT PRIMARY KEY, content TEXT NOT NULL)"
+            )
+            self._db.commit()
+        return self._db
+
+    def _remember(self, key, content):
+        self._lru[key] = content
+        self._lru.move_to_end(key)
+        while len(self._lru) > self.maxsize:
+            self._lru.popitem(last=False)
+
+    def get(self, key):
+        with self._lock:
+            if key in self._lru:
+                self._lru.move_to_end(key)
+                return self._lru[key]
+            try:
+                row = self._conn().execute(
+                    "SELECT content FROM responses WHERE key = ?", (key,)
+                ).fetchone()
+            except sqlite3.Error as e:
+                print(f"⚠️ Błąd odczytu cache: {e}")
+                return None
+            if row is None:
+                return None
+            self._remember(key, row[0])
+            return row[0]
+
+    def set(self, key, content):
+        with self._lock:
+            self._remember(key, content)
+            try:
+                db = self._conn()
+                db.execute(
+                    "INSERT OR REPLACE INTO responses (key, content) VALUES (?, ?)",
+                    (key, content),
+                )
+                db.commit()
+            except sqlite3.Error as e:
+                print(f"⚠️ Błąd zapisu cache: {e}")
+
+
+CACHE = ResponseCache(OPENAI_CACHE_PATH)
+
+
+# ------------------------------------------------------------
+# Limiter zapytań OpenAI (token bucket RPM/TPM, wspólny dla wątków)
+# ------------------------------------------------------------
+class TokenBucket:
+    """Proaktywny limiter: czeka dokładnie tyle, ile trzeba do odnowienia limitu"""
+
+    def __init__(self, rpm, tpm):
+        self.rpm = rpm
+        self.tpm = tpm
+        self.request_tokens = float(rpm)
+        self.token_tokens = float(tpm)
+        self.updated = time.monotonic()
+        self._lock = Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        elapsed = now - self.updated
+        self.updated = now
+        self.request_tokens = min(self.rpm, self.request_tokens + elapsed * self.rpm / 60)
+        self.token_tokens = min(self.tpm, self.token_tokens + elapsed * self.tpm / 60)
+
+    def acquire(self, estimated_tokens):
+        estimated_tokens = min(estimated_tokens, self.tpm)
+        while True:
+            with self._lock:
+                self._refill()
+                if self.request_tokens >= 1 and self.token_tokens >= estimated_tokens:
+                    self.request_tokens -= 1
+                    self.token_tokens -= estimated_tokens
+                    return
+                wait = max(
+                    (1 - self.request_tokens) * 60 / self.rpm,
+                    (estimated_tokens - self.token_tokens) * 60 / self.tpm,
+                )
+            time.sleep(wait)
+
+
+BUCKET = TokenBucket(OPENAI_RPM, OPENAI_TPM)
+
+
+# ------------------------------------------------------------
+# Stan zadań wsadowych (pamięć procesu lub Redis)
+# ------------------------------------------------------------
+class TaskStore:
+    """Postęp zadań; z Redisem współdzielony między workerami i odporny na restart"""
+
+    def __init__(self, redis_url="", ttl=TASK_TTL):
+        self.ttl = ttl
+        self._local = {}
+        self._lock = Lock()
+        self._redis = None
+        if redis_url:
+            import redis  # potrzebny tylko przy REDIS_URL
+
+            self._redis = redis.Redis.from_url(redis_url)
+
+    def update(self, task_id, fields):
+        if self._redis is None:
+            with self._lock:
+                self._local.setdefault(task_id, {}).update(fields)
+            return
+
+        key = f"task:{task_id}"
+        pipe = self._redis.pipeline()
+        pipe.hset(key, mapping={k: json.dumps(v) for k, v in fields.items()})
+        pipe.expire(key, self.ttl)
+        pipe.execute()
+
+    def get(self, task_id):
+        if self._redis is None:
+            with self._lock:
+                task = self._local.get(task_id)
+                return dict(task) if task else None
+
+        data = self._redis.hgetall(f"task:{task_id}")
+        return {k.decode(): json.loads(v) for k, v in data.items()} or None
+
+
+tasks = TaskStore(REDIS_URL)
+
+
+# ------------------------------------------------------------
+# Pomocnicze funkcje
+# ------------------------------------------------------------
+def norm(s):
+    return "" if s is None else str(s).strip()
+
+
+def _cache_lookup(prompt, max_tokens=OPENAI_MAX_TOKENS):
+    """Zwraca odpowiedź z cache (lub None); w trybie replay brak trafienia to błąd"""
+    if OPENAI_CACHE_MODE not in ("enabled", "replay"):
+        return None
+    cached = CACHE.get(ResponseCache.key(prompt, OPENAI_MODEL, OPENAI_TEMPERATURE, max_tokens))
+    if cached is None and OPENAI_CACHE_MODE == "replay":
+        raise RuntimeError("Brak odpowiedzi w cache (OPENAI_CACHE_MODE=replay)")
+    return cached
+
+
+def _cache_store(prompt, content, max_tokens=OPENAI_MAX_TOKENS):
+    if OPENAI_CACHE_MODE in ("enabled", "write-only"):
+        CACHE.set(ResponseCache.key(prompt, OPENAI_MODEL, OPENAI_TEMPERATURE, max_tokens), content)
+
+
+def _openai_body(prompt: str, max_tokens: int = OPENAI_MAX_TOKENS, json_mode: bool = False) -> dict:
+    """Treść zapytania do Chat Completions (wspólna dla trybu online i Batch API)"""
+    body = {
+        "model": OPENAI_MODEL,
+        "messages": [SYSTEM_MSG, {"role": "user", "content": prompt}],
+        "temperature": OPENAI_TEMPERATURE,
+        "max_tokens": max_tokens,
+    }
+    if json_mode:
+        body["response_format"] = {"type": "json_object"}
+    return body
+
+
+def _is_truncated(data: dict) -> bool:
+    """Czy odpowiedź została ucięta przez limit max_tokens"""
+    return (data.get("choices") or [{}])[0].get("finish_reason") == "length"
+
+
+def _extract_content(data: dict) -> str:
+    """Wyciąga treść odpowiedzi z JSON-a Chat Completions"""
+    content = (
+        data.get("choices", [{}])[0]
+        .get("message", {})
+        .get("content", "")
+        .strip()
+    )
+    if content.startswith("```"):
+        # usuwa tylko obramowanie ```html / ```json, nie treść odpowiedzi
+        content = re.sub(r"^```[a-zA-Z]*\s*|\s*```$", "", content).strip()
+    return content
+
+
+def _openai_timeout(max_tokens: int) -> tuple:
+    """(połączenie, odczyt) – bez streamingu odpowiedź przychodzi dopiero w całości,
+    więc odczyt musi wystarczyć na wygenerowanie max_tokens (np. grupy produktów)"""
+    return OPENAI_CONNECT_TIMEOUT, OPENAI_TIMEOUT * max(1.0, max_tokens / OPENAI_MAX_TOKENS)
+
+
+def call_openai(prompt: str, max_tokens: int = OPENAI_MAX_TOKENS, json_mode: bool = False) -> str:
+    """Połączenie z OpenAI Chat Completions API z cache"""
+    cached = _cache_lookup(prompt, max_tokens)
+    if cached is not None:
+        return cached
+
+    if not OPENAI_API_KEY:
+        raise RuntimeError("Brak OPENAI_API_KEY w środowisku")
+
+    content, truncated = _request_completion(prompt, max_tokens, json_mode)
+    if truncated and max_tokens < OPENAI_MAX_TOKENS:
+        # za niski szacunek – ponowienie z pełnym limitem
+        print(f"✂️ Odpowiedź ucięta przy max_tokens={max_tokens}, ponawiam z {OPENAI_MAX_TOKENS}")
+        content, truncated = _request_completion(prompt, OPENAI_MAX_TOKENS, json_mode)
+    if truncated:
+        # ucięta treść (np. niedomknięty JSON grupy) nie może trafić do cache
+        print(f"✂️ Odpowiedź ucięta przy max_tokens={OPENAI_MAX_TOKENS}, pomijam zapis w cache")
+        return content
+
+    _cache_store(prompt, content, max_tokens)
+    return content
+
+
+def _request_completion(prompt: str, max_tokens: int, json_mode: bool) -> tuple:
+    """Pojedyncze zapytanie z retry – zwraca (treść, czy ucięta przez max_tokens)"""
+    url = f"{OPENAI_API_URL}/chat/completions"
+    body = _openai_body(prompt, max_tokens, json_mode)
+    for attempt in range(MAX_RETRIES):
+        # Backoff wykładniczy z losowym rozrzutem (jitter)
+        delay = min(RETRY_MAX_DELAY, 2 ** attempt + random.random())
+        try:
+            BUCKET.acquire(len(prompt) // 4 + max_tokens)
+            resp = SESSION.post(url, headers=OPENAI_HEADERS, json=body, timeout=_openai_timeout(max_tokens))
+            if resp.status_code == 200:
+                data = orjson.loads(resp.content)
+                return _extract_content(data), _is_truncated(data)
+        except (requests.RequestException, ValueError) as e:
+            print(f"⚠️ Wyjątek OpenAI ({attempt + 1}/{MAX_RETRIES}): {e}")
+        else:
+            if resp.status_code not in RETRYABLE_STATUS:
+                # Błędy trwałe (400, 401, 404...) – ponawianie nic nie da
+                raise RuntimeError(f"Błąd OpenAI ({resp.status_code}): {resp.text[:300]}")
+
+            retry_after = resp.headers.get("Retry-After")
+            if retry_after:
+                try:
+                    delay = min(RETRY_MAX_DELAY, float(retry_after))
+                except ValueError:
+                    pass
+            print(f"⚠️ Błąd OpenAI ({resp.status_code}), próba {attempt + 1}/{MAX_RETRIES}")
+
+        if attempt + 1 < MAX_RETRIES:
+            time.sleep(delay)
+
+    raise RuntimeError(f"Nie udało się uzyskać odpowiedzi z OpenAI po {MAX_RETRIES} próbach")
+
+
+def _run_openai_batch(prompts: dict, on_progress=None) -> dict:
+    """Wysyła prompty przez OpenAI Batch API; zwraca {custom_id: treść lub wyjątek}
+
+    prompts: {custom_id: (prompt, max_tokens)}
+    """
+    results = {}
+    pending = {}
+    for custom_id, (prompt, max_tokens) in prompts.items():
+        try:
+            cached = _cache_lookup(prompt, max_tokens)
+        except RuntimeError as e:
+            # replay bez trafienia – błąd tylko tego produktu
+            results[custom_id] = e
+            continue
+        if cached is not None:
+            results[custom_id] = cached
+        else:
+            pending[custom_id] = (prompt, max_tokens)
+
+    if not pending:
+        return results
+    if not OPENAI_API_KEY:
+        raise RuntimeError("Brak OPENAI_API_KEY w środowisku")
+
+    # 📤 Plik JSONL z zapytaniami
+    lines = [
+        json.dumps(
+            {
+                "custom_id": custom_id,
+                "method": "POST",
+                "url": "/v1/chat/completions",
+                "body": _openai_body(prompt, max_tokens),
+            },
+            ensure_ascii=False,
+        )
+        for custom_id, (prompt, max_tokens) in pending.items()
+    ]
+    upload = SESSION.post(
+        f"{OPENAI_API_URL}/files",
+        headers=OPENAI_AUTH_HEADERS,
+        data={"purpose": "batch"},
+        files={"file": ("batch.jsonl", "\n".join(lines).encode("utf-8"), "application/jsonl")},
+        timeout=120,
+    )
+    if upload.status_code != 200:
+        raise RuntimeError(f"Błąd wysyłania pliku do OpenAI ({upload.status_code})")
+
+    create = SESSION.post(
+        f"{OPENAI_API_URL}/batches",
+        headers=OPENAI_AUTH_HEADERS,
+        json={
+            "input_file_id": upload.json()["id"],
+            "endpoint": "/v1/chat/completions",
+            "completion_window": "24h",
+        },
+        timeout=60,
+    )
+    if create.status_code != 200:
+        raise RuntimeError(f"Błąd tworzenia zadania Batch API ({create.status_code})")
+    batch_id = create.json()["id"]
+    print(f"📦 Utworzono batch {batch_id} ({len(pending)} zapytań)")
+
+    # ⏳ Oczekiwanie na zakończenie (najdłużej okno 24h + margines)
+    deadline = time.monotonic() + OPENAI_BATCH_DEADLINE
+    while True:
+        try:
+            resp = SESSION.get(f"{OPENAI_API_URL}/batches/{batch_id}", headers=OPENAI_AUTH_HEADERS, timeout=60)
+        except requests.RequestException as e:
+            print(f"⚠️ Błąd odczytu statusu batcha {batch_id}: {e}")
+        else:
+            if resp.status_code == 200:
+                try:
+                    batch = resp.json()
+                except ValueError as e:
+                    # np. strona błędu proxy z kodem 200 – kolejna próba przy następnym odczycie
+                    print(f"⚠️ Nieczytelny status batcha {batch_id}: {e}")
+                else:
+                    counts = batch.get("request_counts") or {}
+                    if on_progress:
+                        on_progress(len(results) + counts.get("completed", 0) + counts.get("failed", 0))
+                    if batch.get("status") in ("completed", "failed", "expired", "cancelled"):
+                        break
+            elif resp.status_code not in RETRYABLE_STATUS:
+                # np. 401 (unieważniony klucz) lub 404 (zły id) – czekanie nic nie da
+                raise RuntimeError(f"Błąd odczytu statusu batcha {batch_id} ({resp.status_code})")
+            else:
+                print(f"⚠️ Błąd odczytu statusu batcha {batch_id}: {resp.status_code}")
+
+        if time.monotonic() >= deadline:
+            raise RuntimeError(f"Batch {batch_id} nie zakończył się w oczekiwanym czasie")
+        time.sleep(OPENAI_BATCH_POLL_INTERVAL)
+
+    if batch.get("status") == "failed":
+        raise RuntimeError(f"Batch API odrzuciło zadanie: {batch.get('errors')}")
+
+    # 📥 Pobranie wyników (poprawne i błędne odpowiedzi)
+    for file_id in (batch.get("output_file_id"), batch.get("error_file_id")):
+        if not file_id:
+            continue
+        resp = SESSION.get(f"{OPENAI_API_URL}/files/{file_id}/content", headers=OPENAI_AUTH_HEADERS, timeout=120)
+        if resp.status_code != 200:
+            raise RuntimeError(f"Błąd pobierania wyników batcha ({resp.status_code})")
+
+        for line in resp.text.splitlines():
+            if not line.strip():
+                continue
+            item = orjson.loads(line)
+            custom_id = item.get("custom_id")
+            response = item.get("response") or {}
+            body = response.get("body") or {}
+            if response.get("status_code") == 200 and _is_truncated(body):
+                results[custom_id] = RuntimeError("Odpowiedź ucięta przez limit max_tokens")
+            elif response.get("status_code") == 200:
+                content = _extract_content(body)
+                prompt, max_tokens = pending[custom_id]
+                _cache_store(prompt, content, max_tokens)
+                results[custom_id] = content
+            else:
+                error = item.get("error") or body.get("error")
+                results[custom_id] = RuntimeError(f"Błąd OpenAI w batchu: {error}")
+
+    for custom_id in pending:
+        results.setdefault(custom_id, RuntimeError(f"Batch zakończony ze statusem {batch.get('status')}"))
+    return results
+
+
+def compact_html(text: str) -> str:
+    """Usuwa nadmiarowe białe znaki, entery i taby z HTML-a"""
+    if not text:
+        return ""
+    text = re.sub(r"\s+", " ", text)  # zamienia wiele spacji i enterów na jedną spację
+    text = re.sub(r">\s+<", "><", text)  # usuwa odstępy między znacznikami
+    return text.strip()
+
+
+def _strip_html(text: str) -> str:
+    """Zamienia HTML opisu na czysty tekst"""
+    if not text:
+        return ""
+    text = re.sub(r"<(script|style)\b.*?</\1>", " ", text, flags=re.S | re.I)
+    text = re.sub(r"<[^>]+>", " ", text)
+    return re.sub(r"\s+", " ", html.unescape(text)).strip()
+
+
+def _trim_attributes(attributes):
+    """Usuwa puste, zduplikowane i zbyt długie atrybuty; zostawia najwyżej ATTRIBUTES_MAX"""
+    seen = set()
+    trimmed = []
+    for a in attributes:
+        name, value = norm(a.get("name")), norm(a.get("value"))
+        if not value or len(value) > ATTRIBUTE_VALUE_MAX_CHARS or (name, value) in seen:
+            continue
+        seen.add((name, value))
+        trimmed.append((name, value))
+        if len(trimmed) >= ATTRIBUTES_MAX:
+            break
+    return trimmed
+
+
+_shoper_tokens = {}  # (sklep, login, sha1(hasło)) -> (token, czas wygaśnięcia)
+_shoper_login_locks = {}  # klucz -> Lock; logowanie blokuje tylko ten sam sklep/login
+_shoper_tokens_lock = Lock()  # chroni oba słowniki, nie jest trzymany podczas logowania
+
+
+def _shoper_token_key(shop, user, password):
+    return shop, user, hashlib.sha1(password.encode("utf-8")).hexdigest()
+
+
+def _get_shoper_token(shop, user, password):
+    """Zwraca token Shopera z cache albo loguje się ponownie po jego wygaśnięciu"""
+    key = _shoper_token_key(shop, user, password)
+    with _shoper_tokens_lock:
+        login_lock = _shoper_login_locks.setdefault(key, Lock())
+
+    # Wątki tego samego sklepu czekają na jedno logowanie, inne sklepy nie są blokowane
+    with login_lock:
+        with _shoper_tokens_lock:
+            token, expires = _shoper_tokens.get(key, (None, 0))
+        if token and time.monotonic() < expires:
+            return token
+
+        auth_url = f"https://{shop}.shoparena.pl/webapi/rest/auth"
+        token_resp = SESSION.post(auth_url, auth=(user, password), timeout=30)
+        if token_resp.status_code != 200:
+            raise RuntimeError("Błąd logowania do Shopera")
+
+        data = token_resp.json()
+        token = data.get("access_token")
+        ttl = int(data.get("expires_in") or SHOPER_TOKEN_TTL + SHOPER_TOKEN_MARGIN)
+        with _shoper_tokens_lock:
+            _shoper_tokens[key] = (token, time.monotonic() + max(0, ttl - SHOPER_TOKEN_MARGIN))
+        return token
+
+
+def _invalidate_shoper_token(shop, user, password, token):
+    """Usuwa token z cache (o ile nikt go już nie odświeżył)"""
+    key = _shoper_token_key(shop, user, password)
+    with _shoper_tokens_lock:
+        if _shoper_tokens.get(key, (None, 0))[0] == token:
+            del _shoper_tokens[key]
+
+
+def _shoper_headers(token):
+    return {"Authorization": f"Bearer {token}", "Content-Type": "application/json"}
+
+
+def _shoper_get(shop, user, password, url):
+    """GET do API Shopera z tokenem z cache"""
+    token = _get_shoper_token(shop, user, password)
+    resp = SESSION.get(url, headers=_shoper_headers(token), timeout=30)
+    if resp.status_code == 401:
+        # token wygasł przed czasem – jednorazowe ponowne logowanie
+        _invalidate_shoper_token(shop, user, password, token)
+        token = _get_shoper_token(shop, user, password)
+        resp = SESSION.get(url, headers=_shoper_headers(token), timeout=30)
+    return resp
+
+
+def fetch_shoper_products(shop, user, password, ids):
+    """Pobiera dane produktów z Shopera"""
+    base_url = f"https://{shop}.shoparena.pl/webapi/rest"
+
+    def fetch(pid):
+        return _shoper_get(shop, user, password, f"{base_url}/products/{pid}")
+
+    products = []
+    with ThreadPoolExecutor(max_workers=SHOPER_CONCURRENCY) as executor:
+        futures = [(pid, executor.submit(fetch, pid)) for pid in ids]
+        for pid, future in futures:  # kolejność jak w pliku z ID
+            try:
+                resp = future.result()
+            except requests.RequestException as e:
+                print(f"⚠️ Błąd pobierania produktu {pid}: {e}")
+                continue
+            if resp.status_code == 200:
+                products.append(resp.json())
+            else:
+                print(f"⚠️ Błąd pobierania produktu {pid}: {resp.status_code}")
+    return products
+
+
+PROMPT_RULES = """
+Stwórz kompletny opis HTML produktu w następującym układzie (bez ```):
+
+<div class="new-desc-wrapper">
+
+<div class="new-desc-data-wrapper">
+<h3>[nazwa produktu i jego zastosowanie]</h3>
+<p>[opis produktu w 4–6 zdaniach, długość ok. 1000–1500 znaków]</p>
+</div>
+
+<div class="new-desc-listing-wrapper">
+<p>Najważniejsze cechy</p>
+<ul class="new-desc-custom-list">
+<li>[cecha 1]</li>
+<li>[cecha 2]</li>
+<li>[cecha 3]</li>
+<li>[cecha 4]</li>
+<li>[cecha 5]</li>
+</ul>
+</div>
+
+<div class="attr-table-data">
+<h4>Parametry</h4>
+<div class="attr-table-wrapper">
+<div class="attr-table-grey"><div>[nazwa parametru]</div><div>[wartość]</div></div>
+<div class="attr-table-normal"><div>[nazwa parametru]</div><div>[wartość]</div></div>
+[... kolejne parametry naprzemiennie grey/normal ...]
+</div>
+</div>
+
+</div>
+
+Zasady:
+- Generuj czysty HTML, bez ``` ani znaczników języka.
+- Sekcja <p> z opisem powinna mieć ok. 1000–1500 znaków.
+- Lista cech: 4–6 naturalnych, konkretnych punktów.
+- Jeśli atrybuty są puste, wyodrębnij parametry techniczne z opisu.
+- Nie dodawaj stylów inline, komentarzy ani innych elementów.
+- Język polski, profesjonalny, przyjazny, techniczny, bez przesady marketingowej.
+"""
+
+PROMPT_TEMPLATE = PROMPT_RULES + """
+Dane produktu:
+Nazwa: {name}
+Opis: {description}
+Producent: {producer}
+Atrybuty: {attrs}
+Zdjęcie: {image}
+"""
+
+# Wersja dla kilku produktów naraz – dane jako JSON, odpowiedź jako JSON
+GROUP_PROMPT_SUFFIX = """
+Opisz w ten sposób KAŻDY produkt z poniższej listy (osobny, kompletny HTML dla każdego).
+Zwróć wyłącznie obiekt JSON: {"results": [{"id": "<id produktu>", "html": "<opis HTML>"}]}
+
+Dane produktów (JSON):
+"""
+
+
+@lru_cache(maxsize=1024)
+def clean_description(name, description):
+    """Zamienia opis na czysty tekst i skraca do DESCRIPTION_MAX_CHARS
+
+    Wynik jest zapamiętywany – ten sam produkt trafia do kilku promptów
+    (sprawdzenie cache, zapytanie zbiorcze, zapytanie awaryjne).
+    """
+    description = _strip_html(description)
+    if len(description) > DESCRIPTION_MAX_CHARS:
+        print(f"✂️ Skrócono opis produktu {name} ({len(description)} → {DESCRIPTION_MAX_CHARS} znaków)")
+        description = description[:DESCRIPTION_MAX_CHARS].rstrip()
+    return description
+
+
+def _prompt_fields(name, description, attributes, producer_name, image_url=""):
+    """Przygotowuje dane produktu do wstawienia w prompt (opis po clean_description)"""
+    attrs_str = ", ".join(f"{n}: {v}" for n, v in _trim_attributes(attributes))
+
+    return {
+        "name": name,
+        "description": description,
+        "producer": producer_name,
+        "attrs": attrs_str,
+        "image": image_url,
+    }
+
+
+def estimate_max_tokens(description, attributes):
+    """Szacuje limit tokenów odpowiedzi: szkielet HTML + tabela parametrów + opis (po clean_description)"""
+    estimate = (
+        800
+        + 30 * len(_trim_attributes(attributes))
+        + min(400, len(description) // 8)
+    )
+    return min(OPENAI_MAX_TOKENS, estimate)
+
+
+def build_prompt(name, description, attributes, producer_name, image_url=""):
+    """Buduje prompt do generowania opisu produktu"""
+    return PROMPT_TEMPLATE.format(
+        **_prompt_fields(name, description, attributes, producer_name, image_url)
+    )
+
+
+def _build_group_prompt(items):
+    """Buduje jeden prompt dla kilku produktów; items: lista (id, pola z _prompt_fields)"""
+    products = [{"id": item_id, **fields} for item_id, fields in items]
+    return PROMPT_RULES + GROUP_PROMPT_SUFFIX + json.dumps(products, ensure_ascii=False)
+
+
+# ------------------------------------------------------------
+# Asynchroniczne przetwarzanie wsadowe
+# ------------------------------------------------------------
+def _product_fields(p, producer_map):
+    """Wyciąga z produktu Shopera dane potrzebne do promptu (opis już oczyszczony)"""
+    translations = (p.get("translations") or {}).get("pl_PL") or {}
+    name = norm(translations.get("name") or p.get("name"))
+    description = clean_description(name, norm(translations.get("description") or p.get("description")))
+    attributes = p.get("attributes") or []
+    producer_id = p.get("producer_id")
+    producer_name = producer_map.get(producer_id, f"ID {producer_id or 'brak'}")
+    return name, description, attributes, producer_name
+
+
+def _describe_product(p, producer_map):
+    """Generuje opis jednego produktu; zwraca (wiersz Excela, błąd)"""
+    name = ""
+    try:
+        name, description, attributes, producer_name = _product_fields(p, producer_map)
+        prompt = build_prompt(name, description, attributes, producer_name)
+        html_code = compact_html(
+            call_openai(prompt, estimate_max_tokens(description, attributes))
+        )
+        return [p.get("product_id", ""), name, html_code], None
+    except Exception as e:
+        return [p.get("product_id", ""), name or "Brak nazwy", f"Błąd: {e}"], e
+
+
+def _cached_row(p, producer_map):
+    """Wiersz Excela z cache (bez zapytania do OpenAI) albo None"""
+    if OPENAI_CACHE_MODE not in ("enabled", "replay"):
+        return None
+    try:
+        name, description, attributes, producer_name = _product_fields(p, producer_map)
+        prompt = build_prompt(name, description, attributes, producer_name)
+        cached = _cache_lookup(prompt, estimate_max_tokens(description, attributes))
+    except Exception:
+        # replay bez trafienia lub wadliwy produkt – błąd zapisze _describe_product
+        return None
+    if cached is None:
+        return None
+    return [p.get("product_id", ""), name, compact_html(cached)]
+
+
+def _describe_group(group, producer_map):
+    """Generuje opisy kilku produktów jednym zapytaniem; zwraca listę (wiersz, błąd)"""
+    if len(group) == 1:
+        return [_describe_product(group[0], producer_map)]
+
+    try:
+        raw = [_product_fields(p, producer_map) for p in group]
+        fields = [_prompt_fields(*r) for r in raw]
+        estimates = [estimate_max_tokens(r[1], r[2]) for r in raw]
+        prompt = _build_group_prompt([(str(i), f) for i, f in enumerate(fields)])
+        content = call_openai(prompt, sum(estimates), json_mode=True)
+        parsed = orjson.loads(content)
+        items = parsed.get("results") if isinstance(parsed, dict) else None
+        if not isinstance(items, list):
+            raise ValueError("odpowiedź bez listy 'results'")
+        by_id = {str(r.get("id")): r.get("html") for r in items if isinstance(r, dict)}
+    except Exception as e:
+        # wadliwy produkt w grupie lub nieczytelna odpowiedź – każdy produkt osobno,
+        # _describe_product zapisze ewentualny błąd tylko w jego wierszu
+        print(f"⚠️ Nieudane zapytanie zbiorcze ({len(group)} produktów), opis pojedynczo: {e}")
+        return [_describe_product(p, producer_map) for p in group]
+
+    results = []
+    for i, (p, f, estimate) in enumerate(zip(group, fields, estimates)):
+        html_code = by_id.get(str(i))
+        if not html_code or not isinstance(html_code, str):
+            # brak produktu w odpowiedzi – pojedyncze zapytanie
+            results.append(_describe_product(p, producer_map))
+            continue
+        # zapis także pod kluczem pojedynczego promptu (ponowne uruchomienia)
+        _cache_store(PROMPT_TEMPLATE.format(**f), html_code, estimate)
+        results.append(([p.get("product_id", ""), f["name"], compact_html(html_code)], None))
+    return results
+
+
+def _chunks(items, size):
+    """Dzieli listę na kolejne grupy po `size` elementów"""
+    it = iter(items)
+    while chunk := list(itertools.islice(it, size)):
+        yield chunk
+
+
+def _generate_descriptions(executor, products, producer_map):
+    """Zleca opisy grupami w puli wątków; zwraca (wiersz, błąd) w kolejności produktów"""
+    futures = deque(
+        executor.submit(_describe_group, group, producer_map)
+        for group in _chunks(products, max(1, OPENAI_PRODUCTS_PER_REQUEST))
+    )
+    while futures:
+        yield from futures.popleft().result()
+
+
+def _describe_products_batch(executor, products, producer_map, on_progress=None):
+    """Generuje opisy wielu produktów przez Batch API; zwraca (wiersz, błąd) w kolejności produktów"""
+    rows, prompts = [], {}
+    for i, p in enumerate(products):
+        try:
+            name, description, attributes, producer_name = _product_fields(p, producer_map)
+            prompts[str(i)] = (
+                build_prompt(name, description, attributes, producer_name),
+                estimate_max_tokens(description, attributes),
+            )
+        except Exception as e:
+            # wadliwy produkt nie trafia do batcha; błąd zapisze _describe_product
+            print(f"⚠️ Batch: pominięto produkt {p.get('product_id', '')}: {e}")
+            name = ""
+        rows.append((p.get("product_id", ""), name))
+
+    contents = _run_openai_batch(prompts, on_progress)
+
+    # zapytania awaryjne idą równolegle w puli wątków zadania
+    results = []
+    for i, (product_id, name) in enumerate(rows):
+        content = contents.get(str(i))
+        if content is None:
+            results.append(executor.submit(_describe_product, products[i], producer_map))
+        elif isinstance(content, Exception):
+            # nieudane lub ucięte w batchu – ponowienie zwykłym zapytaniem
+            print(f"⚠️ Batch: {name}: {content}, ponawiam pojedynczo")
+            results.append(executor.submit(_describe_product, products[i], producer_map))
+        else:
+            results.append(([product_id, name, compact_html(content)], None))
+    return [r.result() if isinstance(r, Future) else r for r in results]
+
+
+def _update_progress(task_id, start_time, current, total):
+    """📊 Aktualizacja postępu i czasu"""
+    elapsed = (datetime.now() - start_time).seconds
+    progress = int(current / total * 100)
+    eta = int(elapsed / (progress / 100) - elapsed) if progress > 0 else 0
+
+    tasks.update(task_id, {
+        "progress": progress,
+        "elapsed": elapsed,
+        "eta": eta,
+        "current": current,
+        "total": total
+    })
+
+
+def process_task(task_id, shop, user, password, model, product_ids):
+    start_time = datetime.now()
+    tasks.update(task_id, {"progress": 0, "status": "started", "elapsed": 0})
+
+    try:
+        product_ids = list(dict.fromkeys(product_ids))  # bez duplikatów, kolejność zachowana
+
+        # 🔐 Logowanie do Shopera (token z cache, jeśli jeszcze ważny)
+        base_url = f"https://{shop}.shoparena.pl/webapi/rest"
+        _get_shoper_token(shop, user, password)
+
+        # 🔹 Pobranie wszystkich producentów (mapa ID → nazwa)
+        producer_map = {}
+        page = 1
+        while True:
+            resp = _shoper_get(shop, user, password, f"{base_url}/producers?limit=50&page={page}")
+            if resp.status_code != 200:
+                print(f"⚠️ Błąd pobierania producentów (strona {page})")
+                break
+
+            data = resp.json()
+            for p in data.get("list", []):
+                translations = p.get("translations", {}).get("pl_PL", {})
+                name = translations.get("name") or p.get("name") or f"ID {p.get('producer_id')}"
+                producer_map[p["producer_id"]] = name.strip()
+
+            if page >= data.get("pages", 1):
+                break
+            page += 1
+
+        print(f"✅ Załadowano {len(producer_map)} producentów")
+
+        # 🔹 Pobranie danych produktów
+        products = fetch_shoper_products(shop, user, password, product_ids)
+        if not products:
+            raise RuntimeError("Nie udało się pobrać danych produktów z Shopera")
+
+        # 📘 Przygotowanie Excela (tryb write-only: wiersze nie są trzymane w pamięci)
+        import openpyxl  # potrzebny tylko w trybie wsadowym
+
+        wb = openpyxl.Workbook(write_only=True)
+        ws = wb.create_sheet("Descriptions")
+        ws.append(["ID", "Nazwa produktu", "Opis HTML"])
+
+        total = len(products)
+
+        # ♻️ Opisy już obecne w cache nie trafiają do OpenAI
+        cached_rows, pending = {}, []
+        for i, p in enumerate(products):
+            row = _cached_row(p, producer_map)
+            if row is None:
+                pending.append(p)
+            else:
+                cached_rows[i] = row
+        if cached_rows:
+            print(f"♻️ {len(cached_rows)}/{total} opisów z cache")
+        tasks.update(task_id, {"cache_hits": len(cached_rows)})
+
+        with ThreadPoolExecutor(max_workers=OPENAI_CONCURRENCY) as executor:
+            # w trybie replay nic nie jest wysyłane, więc Batch API nie ma sensu
+            batch_mode = OPENAI_CACHE_MODE != "replay" and OPENAI_BATCH_THRESHOLD
+            if batch_mode and len(pending) > OPENAI_BATCH_THRESHOLD:
+                # 📦 Duże zadanie: OpenAI Batch API
+                tasks.update(task_id, {"status": "batch"})
+                generated = iter(_describe_products_batch(
+                    executor,
+                    pending,
+                    producer_map,
+                    lambda done: _update_progress(task_id, start_time, len(cached_rows) + done, total),
+                ))
+            else:
+                # 🧠 Równoległe generowanie opisów, po kilka produktów na zapytanie
+                generated = _generate_descriptions(executor, pending, producer_map)
+
+            # Scalenie wyników z cache i z OpenAI (kolejność wierszy zachowana)
+            for i, p in enumerate(products):
+                if i in cached_rows:
+                    row, error = cached_rows.pop(i), None
+                else:
+                    row, error = next(generated)
+
+                ws.append(row)
+                if error:
+                    print(f"[{i + 1}/{total}] ⚠️ Błąd dla {row[1]}: {error}")
+                else:
+                    print(f"[{i + 1}/{total}] ✅ {row[1]}")
+
+                _update_progress(task_id, start_time, i + 1, total)
+
+        # 💾 Zapis pliku (najpierw .tmp, potem atomowa zmiana nazwy)
+        os.makedirs(STATIC_DIR, exist_ok=True)
+        file_name = f"generated_{task_id}.xlsx"
+        output_path = os.path.join(STATIC_DIR, file_name)
+        wb.save(f"{output_path}.tmp")
+        os.replace(f"{output_path}.tmp", output_path)
+
+        # ✅ Zakończenie
+        tasks.update(task_id, {
+            "status": "done",
+            "file": f"/static/{file_name}",
+            "elapsed": (datetime.now() - start_time).seconds,
+        })
+
+    except Exception as e:
+        tasks.update(task_id, {"status": "error", "error": str(e)})